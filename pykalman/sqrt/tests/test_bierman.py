@@ -7,6 +7,8 @@ from pykalman.datasets import load_robot
 class BiermanKalmanFilterTestSuite(TestCase, KalmanFilterTests):
     """Run Kalman Filter tests on the UDU' Decomposition-based Kalman Filter"""
 
-    def setUp(self):
-        self.KF = BiermanKalmanFilter
-        self.data = load_robot()
+    @classmethod
+    def setUpClass(cls):
+        cls.KF = BiermanKalmanFilter
+        cls.data = load_robot()
+        cls.build_fixtures()
@@ -8,6 +8,8 @@ class CholeskyKalmanFilterTestSuite(TestCase, KalmanFilterTests):
     """Run Kalman Filter tests on the Cholesky Factorization-based Kalman
     Filter"""
 
-    def setUp(self):
-        self.KF = CholeskyKalmanFilter
-        self.data = load_robot()
+    @classmethod
+    def setUpClass(cls):
+        cls.KF = CholeskyKalmanFilter
+        cls.data = load_robot()
+        cls.build_fixtures()
@@ -29,6 +29,6 @@ setup(
 #      'numpydoc',
 #    ],
 #    tests_require = [
-#      'nose',
+#      'pytest',
 #    ]
 )